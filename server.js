@@ -2,25 +2,30 @@
 require('dotenv').config();
 const express = require('express');
 const axios = require('axios');
-const math = require('mathjs');
+const http = require('http');
+const https = require('https');
 const ss = require('simple-statistics');
 const cors = require('cors');
 
 const app = express();
-app.use(express.json());
 app.use(cors());
 app.use(express.static('public'));
 
 const PORT = process.env.PORT || 3000;
 
+// shared client for provider calls; the keep-alive agents target Node < 19,
+// where the global agents open a new connection (and TLS handshake) per call
+const httpClient = axios.create({
+  timeout: 10000,
+  httpAgent: new http.Agent({ keepAlive: true }),
+  httpsAgent: new https.Agent({ keepAlive: true })
+});
+
 // Simple in-memory cache to reduce API calls
 const cache = new Map();
+// entries expire lazily in getCache; keys are bounded by symbol/interval, so no eviction timers
 function setCache(key, value, ttlMs = 10_000) {
   cache.set(key, { value, expires: Date.now() + ttlMs });
-  setTimeout(() => {
-    const c = cache.get(key);
-    if (c && c.expires <= Date.now()) cache.delete(key);
-  }, ttlMs + 50);
 }
 function getCache(key) {
   const c = cache.get(key);
@@ -32,6 +37,23 @@ function getCache(key) {
   return c.value;
 }
 
+// how long a fetched price series is served from memory
+const SERIES_TTL_MS = 10_000;
+
+// latest TwelveData series per cache key, kept past expiry so refreshes only fetch new bars
+const tdSeries = new Map();
+const TD_INCREMENTAL_BARS = 30;
+
+// series fetches currently in progress, keyed like the cache
+const inflight = new Map();
+
+// provider symbols and pip size per supported symbol
+const SYMBOLS = {
+  EURUSD: { td: 'EUR/USD', avFrom: 'EUR', avTo: 'USD', pip: 0.0001 },
+  XAUUSD: { td: 'XAU/USD', avFrom: 'XAU', avTo: 'USD', pip: 0.01 },
+  BTCUSD: { td: 'BTC/USD', cgId: 'bitcoin', pip: 1 }
+};
+
 /**
  * symbol supported: EURUSD, XAUUSD, BTCUSD
  * Returns array of candles: {t: timestamp_ms, open, high, low, close, volume}
@@ -41,35 +63,40 @@ async function getPriceSeries(symbol, interval = '1min', outputsize = 500) {
   const cached = getCache(cacheKey);
   if (cached) return cached;
 
-  // helper mapping
-  const map = {
-    EURUSD: { td: 'EUR/USD', avFrom: 'EUR', avTo: 'USD', pip: 0.0001 },
-    XAUUSD: { td: 'XAU/USD', avFrom: 'XAU', avTo: 'USD', pip: 0.01 },
-    BTCUSD: { td: 'BTC/USD', cgId: 'bitcoin', pip: 1 }
-  };
-  const info = map[symbol];
+  // concurrent requests for the same series share one upstream fetch
+  const pending = inflight.get(cacheKey);
+  if (pending) return pending;
+  const promise = fetchPriceSeries(cacheKey, symbol, interval, outputsize)
+    .finally(() => inflight.delete(cacheKey));
+  inflight.set(cacheKey, promise);
+  return promise;
+}
+
+async function fetchPriceSeries(cacheKey, symbol, interval, outputsize) {
+  const info = SYMBOLS[symbol];
   if (!info) throw new Error('Symbol not supported. Use EURUSD, XAUUSD or BTCUSD.');
 
   // Try TwelveData first if key present
   const tdKey = process.env.TWELVEDATA_KEY;
   if (tdKey) {
     try {
-      const tdSymbol = info.td;
-      const url = `https://api.twelvedata.com/time_series?symbol=${encodeURIComponent(tdSymbol)}&interval=${interval}&outputsize=${outputsize}&format=json&apikey=${tdKey}`;
-      const r = await axios.get(url, { timeout: 10000 });
-      if (r.data && r.data.values) {
-        // values are reverse chronological; convert to chronological
-        const values = r.data.values.slice().reverse();
-        const candles = values.map(v => ({
-          t: new Date(v.datetime).getTime(),
-          open: parseFloat(v.open),
-          high: parseFloat(v.high),
-          low: parseFloat(v.low),
-          close: parseFloat(v.close),
-          volume: v.volume ? parseFloat(v.volume) : null
-        }));
-        setCache(cacheKey, { candles, intervalMinutes: parseIntervalToMinutes(interval), pip: info.pip || 0.0001 });
-        return { candles, intervalMinutes: parseIntervalToMinutes(interval), pip: info.pip || 0.0001 };
+      const intervalMinutes = parseIntervalToMinutes(interval);
+      const prev = tdSeries.get(cacheKey);
+      let candles;
+      // after a recent fetch only the newest bars are needed; a full fetch covers gaps
+      // (the age gate keeps the short window overlapping the previous tail, so that fallback is rare)
+      if (prev && Date.now() - prev.fetchedAt < (TD_INCREMENTAL_BARS - 1) * intervalMinutes * 60_000) {
+        const fresh = await fetchTwelveData(info.td, interval, TD_INCREMENTAL_BARS, tdKey);
+        // an error body (e.g. out of credits) falls through to the next provider instead of a second call
+        candles = fresh && (mergeCandles(prev.candles, fresh, outputsize)
+          || await fetchTwelveData(info.td, interval, outputsize, tdKey));
+      } else {
+        candles = await fetchTwelveData(info.td, interval, outputsize, tdKey);
+      }
+      if (candles) {
+        const result = cacheSeries(cacheKey, candles, intervalMinutes, info.pip || 0.0001);
+        tdSeries.set(cacheKey, result);
+        return result;
       }
     } catch (e) {
       console.warn('TwelveData failed:', e.message || e.toString());
@@ -85,7 +112,7 @@ async function getPriceSeries(symbol, interval = '1min', outputsize = 500) {
       const from_symbol = info.avFrom;
       const to_symbol = info.avTo;
       const url = `https://www.alphavantage.co/query?function=FX_INTRADAY&from_symbol=${from_symbol}&to_symbol=${to_symbol}&interval=${interval}&outputsize=compact&apikey=${avKey}`;
-      const r = await axios.get(url, { timeout: 10000 });
+      const r = await httpClient.get(url);
       // returns object with "Time Series FX (1min)"
       const keyName = Object.keys(r.data).find(k => k.startsWith('Time Series'));
       if (keyName && r.data[keyName]) {
@@ -98,10 +125,9 @@ async function getPriceSeries(symbol, interval = '1min', outputsize = 500) {
           close: parseFloat(v['4. close']),
           volume: null
         }));
-        // entries may be reverse chronological
-        const candles = entries.slice().reverse();
-        setCache(cacheKey, { candles, intervalMinutes: parseIntervalToMinutes(interval), pip: info.pip || 0.0001 });
-        return { candles, intervalMinutes: parseIntervalToMinutes(interval), pip: info.pip || 0.0001 };
+        // entries may be reverse chronological; entries is ours, so reverse in place
+        const candles = entries.reverse();
+        return cacheSeries(cacheKey, candles, parseIntervalToMinutes(interval), info.pip || 0.0001);
       }
     } catch (e) {
       console.warn('AlphaVantage failed:', e.message || e.toString());
@@ -114,7 +140,7 @@ async function getPriceSeries(symbol, interval = '1min', outputsize = 500) {
       // use 1 day data with minute resolution (CoinGecko manages granularity)
       const days = 1;
       const url = `https://api.coingecko.com/api/v3/coins/${info.cgId}/market_chart?vs_currency=usd&days=${days}`;
-      const r = await axios.get(url, { timeout: 10000 });
+      const r = await httpClient.get(url);
       if (r.data && r.data.prices) {
         // prices is array [ [timestamp_ms, price], ... ]
         const candles = r.data.prices.map(p => {
@@ -122,8 +148,7 @@ async function getPriceSeries(symbol, interval = '1min', outputsize = 500) {
           const price = p[1];
           return { t, open: price, high: price, low: price, close: price, volume: null };
         });
-        setCache(cacheKey, { candles, intervalMinutes: 1, pip: info.pip });
-        return { candles, intervalMinutes: 1, pip: info.pip };
+        return cacheSeries(cacheKey, candles, 1, info.pip);
       }
     } catch (e) {
       console.warn('CoinGecko failed:', e.message || e.toString());
@@ -133,6 +158,55 @@ async function getPriceSeries(symbol, interval = '1min', outputsize = 500) {
   throw new Error('Unable to fetch series for ' + symbol + '. Configure TWELVEDATA_KEY or ALPHAVANTAGE_KEY (and for BTC TWELVEDATA or CoinGecko available).');
 }
 
+async function fetchTwelveData(tdSymbol, interval, outputsize, tdKey) {
+  const url = `https://api.twelvedata.com/time_series?symbol=${encodeURIComponent(tdSymbol)}&interval=${interval}&outputsize=${outputsize}&format=json&apikey=${tdKey}`;
+  const r = await httpClient.get(url);
+  if (!r.data || !r.data.values) return null;
+  // values are reverse chronological; fill chronologically in a single pass
+  const values = r.data.values;
+  const candles = new Array(values.length);
+  for (let i = 0, j = values.length - 1; j >= 0; i++, j--) {
+    const v = values[j];
+    candles[i] = {
+      t: new Date(v.datetime).getTime(),
+      open: parseFloat(v.open),
+      high: parseFloat(v.high),
+      low: parseFloat(v.low),
+      close: parseFloat(v.close),
+      volume: v.volume ? parseFloat(v.volume) : null
+    };
+  }
+  return candles;
+}
+
+/**
+ * Merges fresh candles into a previous series, replacing the bars they overlap,
+ * keeping any newer previous bars and at most `limit` candles.
+ * Returns null when the two do not overlap.
+ */
+function mergeCandles(prevCandles, fresh, limit) {
+  if (!fresh.length || !prevCandles.length) return null;
+  const firstT = fresh[0].t;
+  const lastT = fresh[fresh.length - 1].t;
+  if (firstT > prevCandles[prevCandles.length - 1].t) return null;
+  let cut = prevCandles.length;
+  while (cut > 0 && prevCandles[cut - 1].t >= firstT) cut--;
+  let tail = prevCandles.length;
+  while (tail > cut && prevCandles[tail - 1].t > lastT) tail--;
+  const start = Math.max(0, cut + fresh.length + prevCandles.length - tail - limit);
+  const merged = prevCandles.slice(start, cut);
+  for (const c of fresh) merged.push(c);
+  for (let i = tail; i < prevCandles.length; i++) merged.push(prevCandles[i]);
+  return merged.length > limit ? merged.slice(-limit) : merged;
+}
+
+function cacheSeries(cacheKey, candles, intervalMinutes, pip) {
+  const now = Date.now();
+  const result = { candles, intervalMinutes, pip, fetchedAt: now, expires: now + SERIES_TTL_MS };
+  setCache(cacheKey, result, SERIES_TTL_MS);
+  return result;
+}
+
 function parseIntervalToMinutes(interval) {
   if (!interval) return 1;
   if (interval.endsWith('min')) return parseInt(interval.replace('min',''), 10);
@@ -143,69 +217,105 @@ function parseIntervalToMinutes(interval) {
   return isNaN(n) ? 1 : n;
 }
 
-function computeATR(candles, period = 14) {
-  if (!candles || candles.length < 2) return null;
-  const trs = [];
-  for (let i = 0; i < candles.length; i++) {
-    const c = candles[i];
+function computeATR(highs, lows, closes, period = 14) {
+  if (closes.length < 2) return null;
+  // only the trailing window feeds the average, so skip true ranges before it
+  const start = Math.max(0, closes.length - period);
+  let sum = 0;
+  for (let i = start; i < closes.length; i++) {
     if (i === 0) {
-      trs.push(c.high - c.low);
+      sum += highs[i] - lows[i];
     } else {
-      const prev = candles[i - 1];
-      const tr = Math.max(
-        c.high - c.low,
-        Math.abs(c.high - prev.close),
-        Math.abs(c.low - prev.close)
+      const prevClose = closes[i - 1];
+      sum += Math.max(
+        highs[i] - lows[i],
+        Math.abs(highs[i] - prevClose),
+        Math.abs(lows[i] - prevClose)
       );
-      trs.push(tr);
     }
   }
-  const used = trs.slice(-period);
-  const atr = math.mean(used);
-  return { atr, trs, used };
+  return sum / (closes.length - start);
 }
 
-function linearAR1Forecast(closePrices, steps) {
-  // x = prices[0..n-2], y = prices[1..n-1]
-  if (closePrices.length < 2) return { forecast: closePrices[closePrices.length - 1], sigma: 0, phi: 0, intercept: 0 };
-  const xs = [], ys = [];
-  for (let i = 0; i < closePrices.length - 1; i++) {
-    xs.push(closePrices[i]);
-    ys.push(closePrices[i + 1]);
+function fitAR1(closePrices) {
+  // x = prices[0..n-2], y = prices[1..n-1], read in place from closePrices
+  const last = closePrices[closePrices.length - 1];
+  if (closePrices.length < 2) return { phi: 0, intercept: 0, sigma: 0, last, n: 0 };
+  const n = closePrices.length - 1;
+  let sumX = 0, sumY = 0;
+  for (let i = 0; i < n; i++) {
+    sumX += closePrices[i];
+    sumY += closePrices[i + 1];
   }
-  const meanX = math.mean(xs);
-  const meanY = math.mean(ys);
+  const meanX = sumX / n;
+  const meanY = sumY / n;
   let num = 0, den = 0;
-  for (let i = 0; i < xs.length; i++) {
-    num += (xs[i] - meanX) * (ys[i] - meanY);
-    den += Math.pow(xs[i] - meanX, 2);
+  for (let i = 0; i < n; i++) {
+    const dx = closePrices[i] - meanX;
+    num += dx * (closePrices[i + 1] - meanY);
+    den += dx * dx;
   }
   const phi = den === 0 ? 0 : num / den;
   const intercept = meanY - phi * meanX;
 
-  // residuals
-  const residuals = [];
-  for (let i = 0; i < xs.length; i++) {
-    const pred = phi * xs[i] + intercept;
-    residuals.push(ys[i] - pred);
+  // residual sample std, accumulated without materializing the residuals
+  let sumR = 0, sumR2 = 0;
+  for (let i = 0; i < n; i++) {
+    const r = closePrices[i + 1] - (phi * closePrices[i] + intercept);
+    sumR += r;
+    sumR2 += r * r;
   }
-  const sigma = residuals.length <= 1 ? 0 : math.std(residuals);
+  const sigma = n <= 1 ? 0 : Math.sqrt(Math.max(0, (sumR2 - sumR * sumR / n) / (n - 1)));
+
+  return { phi, intercept, sigma, last, n };
+}
+
+function linearAR1Forecast(ar, steps) {
+  const { phi, intercept, sigma, last } = ar;
+  if (ar.n === 0) return { forecast: last, sigma, phi, intercept };
+  // closed form of iterating x -> phi * x + intercept `steps` times
+  const phiPow = Math.pow(phi, steps);
+  const forecast = phi === 1
+    ? last + intercept * steps
+    : phiPow * last + intercept * (1 - phiPow) / (1 - phi);
+  return { forecast, sigma, phi, intercept };
+}
 
-  // iterate forecast
-  let current = closePrices[closePrices.length - 1];
-  for (let s = 0; s < steps; s++) {
-    const next = phi * current + intercept;
-    current = next;
+// series-level analytics (ATR and AR(1) fit), computed together once per fetched series
+function getSeriesModel(seriesData) {
+  if (!seriesData.model) {
+    // column arrays for the analytics, extracted only when a model is first needed
+    const candles = seriesData.candles;
+    const n = candles.length;
+    const highs = new Float64Array(n);
+    const lows = new Float64Array(n);
+    const closes = new Float64Array(n);
+    for (let i = 0; i < n; i++) {
+      highs[i] = candles[i].high;
+      lows[i] = candles[i].low;
+      closes[i] = candles[i].close;
+    }
+    seriesData.model = {
+      atr: computeATR(highs, lows, closes, 14),
+      ar1: fitAR1(closes)
+    };
   }
-  return { forecast: current, sigma, phi, intercept };
+  return seriesData.model;
 }
 
 app.get('/api/prices/:symbol', async (req, res) => {
   try {
     const symbol = (req.params.symbol || '').toUpperCase();
     const data = await getPriceSeries(symbol);
-    const last = data.candles[data.candles.length - 1];
-    res.json({ ok: true, symbol, intervalMinutes: data.intervalMinutes, pip: data.pip, candles: data.candles, lastPrice: last.close });
+    // the payload only depends on the series, so serialize it once per fetched series
+    if (!data.pricesJson) {
+      const last = data.candles[data.candles.length - 1];
+      data.pricesJson = JSON.stringify({ ok: true, symbol, intervalMinutes: data.intervalMinutes, pip: data.pip, candles: data.candles, lastPrice: last.close });
+    }
+    // let the browser reuse the response until the cached series expires
+    const maxAge = Math.max(0, Math.floor((data.expires - Date.now()) / 1000));
+    res.set('Cache-Control', `private, max-age=${maxAge}`);
+    res.type('json').send(data.pricesJson);
   } catch (e) {
     res.status(500).json({ ok: false, error: e.message || String(e) });
   }
@@ -215,7 +325,7 @@ app.get('/api/prices/:symbol', async (req, res) => {
  * /api/calc (POST)
  * body: { symbol, balance, riskPercent, stopLossPips (optional), rr (optional), horizonMinutes (optional), entryPrice (optional) }
  */
-app.post('/api/calc', async (req, res) => {
+app.post('/api/calc', express.json(), async (req, res) => {
   try {
     const body = req.body || {};
     const symbol = (body.symbol || 'EURUSD').toUpperCase();
@@ -233,11 +343,10 @@ app.post('/api/calc', async (req, res) => {
 
     const lastCandle = candles[candles.length - 1];
     const entryPrice = entryPriceProvided || lastCandle.close;
-    const closePrices = candles.map(c => c.close);
 
-    // ATR
-    const atrResult = computeATR(candles, 14);
-    const atr = atrResult ? atrResult.atr : null;
+    // ATR and AR(1) fit only depend on the series, so reuse them while it is cached
+    const model = getSeriesModel(seriesData);
+    const atr = model.atr;
 
     // stop loss price move (in price units)
     let stopLossPriceMove;
@@ -263,14 +372,17 @@ app.post('/api/calc', async (req, res) => {
     const lots = units / 100000; // standard lot = 100k
 
     // compute SL and TP (assume LONG for clarity; we will show both long and short)
-    const slLong = +(entryPrice - stopLossPriceMove);
-    const tpLong = +(entryPrice + stopLossPriceMove * rr);
-    const slShort = +(entryPrice + stopLossPriceMove);
-    const tpShort = +(entryPrice - stopLossPriceMove * rr);
+    const takeProfitPriceMove = stopLossPriceMove * rr;
+    const slLong = entryPrice - stopLossPriceMove;
+    const tpLong = entryPrice + takeProfitPriceMove;
+    const slShort = entryPrice + stopLossPriceMove;
+    const tpShort = entryPrice - takeProfitPriceMove;
 
     // Forecast using AR(1)
-    const steps = Math.max(1, Math.round(horizonMinutes / Math.max(1, intervalMinutes)));
-    const ar = linearAR1Forecast(closePrices, steps);
+    // a non-numeric horizon parses to NaN; forecast a single step rather than return NaN
+    const rawSteps = Math.round(horizonMinutes / Math.max(1, intervalMinutes));
+    const steps = Number.isFinite(rawSteps) ? Math.max(1, rawSteps) : 1;
+    const ar = linearAR1Forecast(model.ar1, steps);
     const forecast = ar.forecast;
     const sigma = ar.sigma;
     // gaussian diffusion: +/- 1.96 * sigma * sqrt(steps) for 95% conf